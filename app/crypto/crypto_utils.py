@@ -1,35 +1,149 @@
 import os
-import json
-from base64 import urlsafe_b64encode, urlsafe_b64decode
+import hashlib
+import hmac
+import threading
+from base64 import b64encode, urlsafe_b64decode
+from functools import lru_cache
+from typing import Callable, Dict, Tuple
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-
-def derive_key(password: str, salt: bytes) -> bytes:
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=salt,
-        iterations=100_000,
-    )
-    return kdf.derive(password.encode())
-
-def encrypt(password: str, plaintext: str) -> dict:
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+
+# scrypt cost parameters for new vaults; stored in the vault header so they can be raised later
+SCRYPT_N = 2**15
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+AEADS = {
+    "aes-gcm": AESGCM,
+    "chacha20-poly1305": ChaCha20Poly1305,
+}
+
+def _has_aes_instructions() -> bool:
+    # Both x86 ("flags") and ARM ("Features") list hardware AES as "aes"
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    return "aes" in line.split(":", 1)[1].split()
+    except OSError:
+        pass
+    # No cpuinfo to inspect (macOS, Windows): those CPUs ship AES instructions
+    return True
+
+# ChaCha20 is faster than software AES on CPUs without AES instructions
+DEFAULT_ALG = "aes-gcm" if _has_aes_instructions() else "chacha20-poly1305"
+
+# Random per-process key, so fingerprints of the master held in memory can't
+# be checked against guesses without it, unlike a plain hash
+_FINGERPRINT_KEY = os.urandom(32)
+
+def password_fingerprint(password: str) -> bytes:
+    """Keyed hash identifying a password for the life of the process, without storing it."""
+    return hmac.new(_FINGERPRINT_KEY, password.encode(), hashlib.sha256).digest()
+
+# Derived keys by (KDF, password fingerprint, salt, parameters). Keying on the
+# fingerprint rather than the password bytes, as lru_cache would, means the
+# cache never holds the master itself once the form field is cleared.
+_KDF_CACHE_SIZE = 32
+_derived_keys: Dict[tuple, bytes] = {}
+_derived_keys_lock = threading.Lock()
+
+def _cached_kdf(cache_key: tuple, derive: Callable[[], bytes]) -> bytes:
+    with _derived_keys_lock:
+        key = _derived_keys.get(cache_key)
+    if key is None:
+        key = derive()
+        with _derived_keys_lock:
+            if len(_derived_keys) >= _KDF_CACHE_SIZE:
+                del _derived_keys[next(iter(_derived_keys))]  # Oldest first
+            _derived_keys[cache_key] = key
+    return key
+
+def _derive_legacy_key(password: str, salt: bytes) -> bytes:
+    # Records of the original vault.json carry no KDF parameters
+    def derive() -> bytes:
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=salt,
+            iterations=100_000,
+        )
+        return kdf.derive(password.encode())
+
+    return _cached_kdf(("pbkdf2", password_fingerprint(password), salt), derive)
+
+@lru_cache(maxsize=32)
+def _cipher(alg: str, key: bytes):
+    # Reuse the expanded key schedule for records sharing a key
+    return AEADS[alg](key)
+
+@lru_cache(maxsize=32)
+def _tag_key(key: bytes) -> bytes:
+    # Separate subkey so the data key is never used directly as an HMAC key
+    return hmac.new(key, b"service-tag", hashlib.sha256).digest()
+
+def derive_key(password: str, salt: bytes, n: int = SCRYPT_N, r: int = SCRYPT_R, p: int = SCRYPT_P) -> bytes:
+    def derive() -> bytes:
+        return Scrypt(salt=salt, length=32, n=n, r=r, p=p).derive(password.encode())
+
+    return _cached_kdf(("scrypt", password_fingerprint(password), salt, n, r, p), derive)
+
+def new_key_header(password: str) -> Tuple[dict, bytes]:
+    """Create a random data key wrapped under a password-derived key.
+
+    Returns the header needed to unwrap it again and the data key itself.
+    Changing the password only means re-wrapping this key, not re-encrypting
+    every record.
+    """
     salt = os.urandom(16)
-    key = derive_key(password, salt)
-    aesgcm = AESGCM(key)
-    nonce = os.urandom(12)
-    ciphertext = aesgcm.encrypt(nonce, plaintext.encode(), None)
-    return {
-        "salt": urlsafe_b64encode(salt).decode(),
-        "nonce": urlsafe_b64encode(nonce).decode(),
-        "ciphertext": urlsafe_b64encode(ciphertext).decode()
+    kek = derive_key(password, salt)
+    dek = os.urandom(32)
+    key_nonce = os.urandom(12)
+    header = {
+        "kdf": "scrypt",
+        "n": SCRYPT_N,
+        "r": SCRYPT_R,
+        "p": SCRYPT_P,
+        "salt": b64encode(salt).decode(),
+        "key_alg": DEFAULT_ALG,
+        "key_nonce": b64encode(key_nonce).decode(),
+        "wrapped_key": b64encode(_cipher(DEFAULT_ALG, kek).encrypt(key_nonce, dek, None)).decode(),
     }
+    return header, dek
 
-def decrypt(password: str, data: dict) -> str:
+def encrypt_raw(key: bytes, plaintext: bytes) -> Tuple[str, bytes, bytes]:
+    """Encrypt under the default cipher, returning its name, the 12-byte nonce and the ciphertext."""
+    nonce = os.urandom(12)
+    return DEFAULT_ALG, nonce, _cipher(DEFAULT_ALG, key).encrypt(nonce, plaintext, None)
+
+def service_tag(key: bytes, service: str) -> bytes:
+    """Keyed 16-byte tag of a service name, letting duplicates be found without decrypting records."""
+    return hmac.new(_tag_key(key), service.encode(), hashlib.sha256).digest()[:16]
+
+# Header fields are written with standard base64, which skips the character
+# translation urlsafe_b64encode adds. urlsafe_b64decode reads both alphabets,
+# so the original vault.json's URL-safe records still decode.
+
+def record_key(password: str, data: dict) -> bytes:
     salt = urlsafe_b64decode(data["salt"])
+    if data.get("kdf") == "scrypt":
+        return derive_key(password, salt, data["n"], data["r"], data["p"])
+    return _derive_legacy_key(password, salt)
+
+def unwrap_key(password: str, header: dict) -> bytes:
+    """Recover the data key from a header; fails with InvalidTag on a wrong password."""
+    kek = record_key(password, header)
+    key_nonce = urlsafe_b64decode(header["key_nonce"])
+    wrapped_key = urlsafe_b64decode(header["wrapped_key"])
+    return _cipher(header["key_alg"], kek).decrypt(key_nonce, wrapped_key, None)
+
+def decrypt_raw(key: bytes, alg: str, nonce: bytes, ciphertext: bytes) -> bytes:
+    return _cipher(alg, key).decrypt(nonce, ciphertext, None)
+
+def decrypt(password: str, data: dict) -> str:
+    """Decrypt a record of the original vault.json, salted and AES-GCM encrypted on its own."""
     nonce = urlsafe_b64decode(data["nonce"])
     ciphertext = urlsafe_b64decode(data["ciphertext"])
-    key = derive_key(password, salt)
-    aesgcm = AESGCM(key)
-    return aesgcm.decrypt(nonce, ciphertext, None).decode()
+    return decrypt_raw(record_key(password, data), "aes-gcm", nonce, ciphertext).decode()
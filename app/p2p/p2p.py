@@ -1,20 +1,51 @@
+import asyncio
 import socket
 import ssl
+import struct
+from functools import lru_cache
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; fall back to an unlocked check
+    fcntl = None
+
 CERT_FILE = Path("app/p2p/cert.pem")
 KEY_FILE = Path("app/p2p/key.pem")
+LOCK_FILE = Path("app/p2p/cert.lock")
+
+# Messages are framed as a 4-byte big-endian length followed by the payload
+HEADER = struct.Struct(">I")
+MAX_MESSAGE_SIZE = 1 << 20
 
+def _tune_socket(sock: socket.socket) -> None:
+    """Send small messages immediately and size buffers to hold a full message."""
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, MAX_MESSAGE_SIZE)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, MAX_MESSAGE_SIZE)
+    if hasattr(socket, "TCP_QUICKACK"):  # Linux only
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+
+@lru_cache(maxsize=1)
 def create_self_signed_cert():
     if CERT_FILE.exists() and KEY_FILE.exists():
         return
+    # Serialize generation so concurrent processes don't both write the PEMs
+    with open(LOCK_FILE, "w") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        if CERT_FILE.exists() and KEY_FILE.exists():
+            return
+        _write_self_signed_cert()
+
+def _write_self_signed_cert():
     from cryptography import x509
     from cryptography.x509.oid import NameOID
-    from cryptography.hazmat.primitives import serialization, hashes
-    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519
     from datetime import datetime, timedelta
 
-    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    key = ed25519.Ed25519PrivateKey.generate()
     subject = issuer = x509.Name([
         x509.NameAttribute(NameOID.COUNTRY_NAME, u"US"),
         x509.NameAttribute(NameOID.STATE_OR_PROVINCE_NAME, u"State"),
@@ -34,7 +65,7 @@ def create_self_signed_cert():
             x509.SubjectAlternativeName([x509.DNSName(u"localhost")]),
             critical=False,
         )
-        .sign(key, hashes.SHA256())
+        .sign(key, None)  # Ed25519 signs without a separate digest
     )
 
     with open(CERT_FILE, "wb") as f:
@@ -42,27 +73,73 @@ def create_self_signed_cert():
     with open(KEY_FILE, "wb") as f:
         f.write(key.private_bytes(
             encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.TraditionalOpenSSL,
+            format=serialization.PrivateFormat.PKCS8,
             encryption_algorithm=serialization.NoEncryption(),
         ))
 
 def share_password(data: str, host="127.0.0.1", port=65432):
     create_self_signed_cert()
-    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    with socket.create_connection((host, port)) as sock:
+        _tune_socket(sock)
+        with _client_context().wrap_socket(sock, server_hostname=host) as ssock:
+            payload = data.encode()
+            ssock.sendall(HEADER.pack(len(payload)) + payload)
+
+# Contexts are built once and shared: create_default_context loads the whole
+# system CA store (tens of ms), which neither side uses since peers present
+# self-signed certificates that aren't verified
+
+@lru_cache(maxsize=1)
+def _client_context() -> ssl.SSLContext:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
     context.check_hostname = False
     context.verify_mode = ssl.CERT_NONE
-    with socket.create_connection((host, port)) as sock:
-        with context.wrap_socket(sock, server_hostname=host) as ssock:
-            ssock.sendall(data.encode())
+    context.minimum_version = ssl.TLSVersion.TLSv1_3
+    return context
 
-def receive_password(host="0.0.0.0", port=65432):
-    create_self_signed_cert()
-    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+@lru_cache(maxsize=1)
+def _server_context() -> ssl.SSLContext:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = ssl.TLSVersion.TLSv1_3
     context.load_cert_chain(certfile=str(CERT_FILE), keyfile=str(KEY_FILE))
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+    return context
+
+def _listening_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        # Buffer sizes must be set before listen() to affect the TCP window
+        _tune_socket(sock)
         sock.bind((host, port))
         sock.listen(1)
-        conn, _ = sock.accept()
-        with context.wrap_socket(conn, server_side=True) as ssock:
-            return ssock.recv(4096).decode()
+    except OSError:
+        sock.close()  # e.g. the port is already in use
+        raise
+    return sock
+
+def _check_size(size: int) -> None:
+    if size > MAX_MESSAGE_SIZE:
+        raise ValueError(f"Incoming message of {size} bytes exceeds the {MAX_MESSAGE_SIZE} byte limit.")
+
+async def receive_password_async(host="0.0.0.0", port=65432) -> str:
+    """Wait for one framed message on the running event loop instead of blocking a thread."""
+    create_self_signed_cert()
+    context = _server_context()
+    received = asyncio.get_running_loop().create_future()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        _tune_socket(writer.get_extra_info("socket"))
+        try:
+            (size,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+            _check_size(size)
+            payload = await reader.readexactly(size)
+            if not received.done():
+                received.set_result(payload.decode())
+        except Exception as e:
+            if not received.done():
+                received.set_exception(e)
+        finally:
+            writer.close()
 
+    server = await asyncio.start_server(handle, sock=_listening_socket(host, port), ssl=context)
+    async with server:
+        return await received
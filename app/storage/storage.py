@@ -0,0 +1,331 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.crypto.crypto_utils import (
+    decrypt,
+    decrypt_raw,
+    encrypt_raw,
+    new_key_header,
+    service_tag,
+    unwrap_key,
+)
+
+try:
+    import orjson  # Native JSON codec, several times faster than the stdlib
+except ImportError:
+    orjson = None
+
+# Define vault file location; length-prefixed binary records, see _iter_frames
+VAULT_PATH = Path("app/data/vault.bin")
+# The original vault: a JSON list of records, each salted and encrypted on its own
+LEGACY_VAULT_PATH = Path("app/data/vault.json")
+
+# The binary vault is MAGIC, then frames of a 4-byte little-endian length and
+# a payload. The first payload is the JSON key header; every other one is a
+# record: a cipher id byte, the 12-byte nonce, the 16-byte service tag and
+# the raw ciphertext.
+MAGIC = b"PMV\x01"
+FRAME = struct.Struct("<I")
+_ALG_IDS = {"aes-gcm": 0, "chacha20-poly1305": 1}
+_ALGS = list(_ALG_IDS)
+_NONCE_END = 13
+_TAG_END = 29
+# Records are refused above this size when written, so a longer declared
+# size can only be damage; the smallest record is the fields plus the AEAD tag
+MAX_RECORD_SIZE = 1 << 16
+_MIN_RECORD_SIZE = _TAG_END + 16
+
+class CorruptVaultError(ValueError):
+    """The vault file isn't in a layout this version can read."""
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to compact JSON bytes."""
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+def loads(data: Any) -> Any:
+    """Parse JSON from str or bytes; errors subclass json.JSONDecodeError either way."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# Kept open across saves so appending a record costs no open()/close(); see _appender
+_append_file: Optional[BinaryIO] = None
+
+# Below this many records a thread pool costs more than it saves
+PARALLEL_DECRYPT_THRESHOLD = 1024
+
+def iter_vault() -> Iterator[Any]:
+    """Yield the vault's header and then its records one at a time; a missing vault yields nothing.
+
+    Records come out as bytes. A vault.json not yet migrated by a save
+    yields its whole record list as a single item instead.
+    """
+    try:
+        f = open(VAULT_PATH, "rb")
+    except FileNotFoundError:
+        yield from _iter_legacy()
+        return
+    with f:
+        yield from _iter_frames(f)
+
+def _iter_legacy() -> Iterator[Any]:
+    try:
+        with open(LEGACY_VAULT_PATH, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return
+    # One JSON document, possibly spread over many lines, so it is parsed whole
+    records = loads(data)
+    if not isinstance(records, list):
+        raise CorruptVaultError("Not a vault file.")
+    yield records
+
+def _iter_frames(f: BinaryIO) -> Iterator[Any]:
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:  # Empty files can't be mapped
+        return
+    with mm:
+        if mm[:len(MAGIC)] != MAGIC:
+            raise CorruptVaultError("Not a vault file.")
+        for start, end in _frame_spans(mm):
+            # A torn final record comes out short, so it fails to decrypt and is counted
+            payload = mm[start + FRAME.size:end]
+            yield loads(payload) if start == len(MAGIC) else payload
+
+def _frame_spans(buf: Any) -> Iterator[Tuple[int, int]]:
+    """Yield the start and end offset of each frame, length prefix included.
+
+    Only the last frame may end past the buffer, and only where a crash
+    during an append could have left it: a record whose declared size is
+    one this module writes. Any other overrun raises CorruptVaultError.
+    """
+    pos = len(MAGIC)
+    while pos < len(buf):
+        if pos + FRAME.size > len(buf):
+            # The append died inside the length prefix
+            yield pos, pos + FRAME.size
+            return
+        (size,) = FRAME.unpack_from(buf, pos)
+        end = pos + FRAME.size + size
+        if end > len(buf) and (pos == len(MAGIC) or not _MIN_RECORD_SIZE <= size <= MAX_RECORD_SIZE):
+            raise CorruptVaultError("Vault file is damaged.")
+        yield pos, end
+        pos = end
+
+def read_vault() -> List[Any]:
+    """Return the vault's header and records as iter_vault yields them; empty when no vault exists."""
+    return list(iter_vault())
+
+def vault_mtime() -> Optional[int]:
+    """Return the vault file's modification time in nanoseconds, or None if it doesn't exist."""
+    for path in (VAULT_PATH, LEGACY_VAULT_PATH):
+        try:
+            return path.stat().st_mtime_ns
+        except FileNotFoundError:
+            pass
+    return None
+
+def vault_exists() -> bool:
+    return vault_mtime() is not None
+
+def _is_header(item: Any) -> bool:
+    # vault.bin starts with a header holding the wrapped data key; vault.json is a list
+    return isinstance(item, dict)
+
+def decrypt_vault(master: str, items: Optional[Iterable[Any]]) -> Tuple[List[Dict[str, str]], int]:
+    """Decrypt what iter_vault yields, returning the entries and the count of unreadable records.
+
+    The vault is a header holding a random data key wrapped under the
+    master-derived key, followed by one record per entry encrypted with the
+    data key and tagged with a keyed hash of its service name. A load costs
+    one KDF however many entries there are, and a wrong master fails on the
+    unwrap before any record is touched. The original vault.json, a JSON
+    list with one separately salted record per entry, is still read and is
+    rewritten as vault.bin on the next save.
+
+    Items may be the lazy iterator itself, so records are read from the file
+    as they are decrypted rather than all held at once.
+    """
+    items = iter(items or ())
+    first = next(items, None)
+    if first is None:
+        return [], 0
+    if _is_header(first):
+        # Only the unwrap raises; a record that fails on its own is counted instead
+        return _decrypt_records(unwrap_key(master, first), items)
+    entries = []
+    errors = 0
+    for record in first:
+        try:
+            entries.append(loads(decrypt(master, record)))
+        except Exception:
+            errors += 1
+    return entries, errors
+
+def service_in_vault(master: str, items: Optional[List[Any]], service: str) -> Optional[bool]:
+    """Check for a service name using the records' service tags, decrypting nothing.
+
+    Returns None for an empty vault or a vault.json, which has no tags and
+    has to be decrypted anyway since the next save rewrites it. Raises on a
+    wrong master password, like decrypt_vault.
+    """
+    if not items or not _is_header(items[0]):
+        return None
+    tags = {record[_NONCE_END:_TAG_END] for record in items[1:]}
+    return service_tag(unwrap_key(master, items[0]), service) in tags
+
+def _decrypt_entry(key: bytes, record: bytes) -> Optional[Dict[str, str]]:
+    """Decrypt one record, or return None when it is damaged."""
+    try:
+        plaintext = decrypt_raw(key, _ALGS[record[0]], record[1:_NONCE_END], record[_TAG_END:])
+        # Both codecs parse the UTF-8 plaintext bytes directly, no str decode first
+        entry = loads(plaintext)
+        # Most entries share one of a few logins (usually an email address); keep one copy of each
+        entry["username"] = sys.intern(entry["username"])
+    except Exception:
+        return None
+    return entry
+
+def _decrypt_records(key: bytes, records: Iterable[bytes]) -> Tuple[List[Dict[str, str]], int]:
+    def decrypt_chunk(chunk: Iterable[bytes]) -> List[Optional[Dict[str, str]]]:
+        return [_decrypt_entry(key, record) for record in chunk]
+
+    workers = os.cpu_count() or 1
+    records = iter(records)
+    batch = list(islice(records, PARALLEL_DECRYPT_THRESHOLD))
+    if workers == 1 or len(batch) < PARALLEL_DECRYPT_THRESHOLD:
+        results = decrypt_chunk(batch)
+        results.extend(decrypt_chunk(records))
+    else:
+        # Hand the pool one batch at a time, one contiguous chunk per core, so only
+        # a batch of parsed records is held alongside the decrypted entries
+        size = -(-PARALLEL_DECRYPT_THRESHOLD // workers)
+        results = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while batch:
+                chunks = [batch[i:i + size] for i in range(0, len(batch), size)]
+                for chunk in pool.map(decrypt_chunk, chunks):
+                    results.extend(chunk)
+                batch = list(islice(records, PARALLEL_DECRYPT_THRESHOLD))
+    entries = [entry for entry in results if entry is not None]
+    return entries, len(results) - len(entries)
+
+def _read_header() -> Optional[dict]:
+    # Only a binary vault's header counts; older vaults get rewritten instead of appended to
+    try:
+        with open(VAULT_PATH, "rb") as f:
+            prefix = f.read(len(MAGIC) + FRAME.size)
+            if not prefix:
+                return None
+            if len(prefix) < len(MAGIC) + FRAME.size or not prefix.startswith(MAGIC):
+                raise CorruptVaultError("Not a vault file.")
+            (size,) = FRAME.unpack_from(prefix, len(MAGIC))
+            return loads(f.read(size))
+    except FileNotFoundError:
+        return None
+
+def _frame(payload: bytes) -> bytes:
+    return FRAME.pack(len(payload)) + payload
+
+def _encode_entry(key: bytes, entry: Dict[str, str]) -> bytes:
+    alg, nonce, ciphertext = encrypt_raw(key, dumps(entry))
+    record = bytes((_ALG_IDS[alg],)) + nonce + service_tag(key, entry["service"]) + ciphertext
+    if len(record) > MAX_RECORD_SIZE:
+        raise ValueError("Entry is too large to save.")
+    return _frame(record)
+
+def append_entry(master: str, entries: List[Dict[str, str]], entry: Dict[str, str]) -> None:
+    """Add one entry to a vault whose existing entries have already been decrypted.
+
+    Current-format vaults get a single appended record. Empty or older vaults
+    are rewritten in full, which also migrates them. Raises ValueError for an
+    oversized entry and CorruptVaultError for a damaged vault.
+    """
+    header = _read_header()
+    if header is None:
+        write_vault(master, entries + [entry])
+        return
+    key = unwrap_key(master, header)
+    f = _appender()
+    f.write(_encode_entry(key, entry))
+    os.fsync(f.fileno())
+
+def _appender() -> BinaryIO:
+    """Return the long-lived append handle, reopening it if the vault file was replaced."""
+    global _append_file
+    path_stat = os.stat(VAULT_PATH)
+    if _append_file is not None:
+        open_stat = os.fstat(_append_file.fileno())
+        if (open_stat.st_dev, open_stat.st_ino) == (path_stat.st_dev, path_stat.st_ino):
+            return _append_file
+        _append_file.close()
+    _trim_torn_frame()
+    # Unbuffered, so each save reaches the file in a single write() before we return
+    _append_file = open(VAULT_PATH, "ab", buffering=0)
+    return _append_file
+
+def _trim_torn_frame() -> None:
+    # Appending after a partial frame would misalign every later record.
+    # _frame_spans raises on anything but a torn final append, so nothing
+    # else is ever cut off.
+    with open(VAULT_PATH, "r+b") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            torn = None
+            for start, end in _frame_spans(mm):
+                if end > len(mm):
+                    torn = start
+        if torn is not None:
+            f.truncate(torn)
+
+def close_vault() -> None:
+    """Close the append handle kept open between saves."""
+    global _append_file
+    if _append_file is not None:
+        _append_file.close()
+        _append_file = None
+
+def write_vault(master: str, entries: List[Dict[str, str]]) -> None:
+    """Rewrite the whole vault; used for migration and overwrites.
+
+    An existing wrapped data key is kept, so compaction costs no new KDF run.
+    The new file replaces the old one atomically.
+    """
+    if not entries:
+        clear_vault()
+        return
+    header = _read_header()
+    if header is not None:
+        key = unwrap_key(master, header)
+    else:
+        header, key = new_key_header(master)
+    # Serialize in memory and hand the OS the whole file in one write()
+    records = (_encode_entry(key, entry) for entry in entries)
+    _replace_vault(b"".join([MAGIC, _frame(dumps(header)), *records]))
+
+def clear_vault() -> None:
+    """Reset the vault file to an empty vault."""
+    _replace_vault(b"")
+
+def _replace_vault(data: bytes) -> None:
+    # Write a sibling file and rename it over the vault, so a crash mid-write
+    # leaves the old vault intact instead of a truncated one
+    tmp_path = VAULT_PATH.with_name(VAULT_PATH.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    # Windows can't replace a file that is still open; _appender reopens it on the next save
+    close_vault()
+    os.replace(tmp_path, VAULT_PATH)
+    # vault.bin now holds everything; drop the vault.json it superseded
+    LEGACY_VAULT_PATH.unlink(missing_ok=True)
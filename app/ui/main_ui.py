@@ -1,26 +1,63 @@
 
-import json  # For handling JSON read/write
-import pyperclip  # For clipboard support
-from pathlib import Path  # For file paths
-from typing import Dict, Optional, Tuple, Any  # For type hints
+import asyncio  # For running blocking network calls off the event loop
+import re  # For port validation
+import json  # For JSONDecodeError, raised by both codecs
+import pyperclip  # For clipboard access
+from base64 import b64encode  # For OSC 52 clipboard payloads when there is no system clipboard
+from typing import Any, Callable, Dict, List, Optional, Tuple  # For type hints
+from functools import partial  # For binding arguments to worker callables
 from uuid import uuid4  # For generating unique confirmation IDs
 
 from textual.app import App, ComposeResult  # Main app structure
 from textual.containers import Horizontal, Vertical  # Layout controls
 from textual.widgets import Header, Footer, Input, Button, Static, DataTable, Label  # UI elements
-from textual.validation import Number  # For port validation
-
-# Import encryption/decryption functions (assumed to exist)
-from app.crypto.crypto_utils import encrypt, decrypt
+from textual.validation import Function  # For port validation
+from textual.worker import get_current_worker  # For noticing a superseded load
+
+# Import encrypted vault storage helpers
+from app.storage.storage import (
+    VAULT_PATH, CorruptVaultError, dumps, loads, vault_exists, vault_mtime,
+    iter_vault, read_vault, service_in_vault, decrypt_vault,
+    append_entry, write_vault, clear_vault, close_vault,
+)
+# Import the keyed master password fingerprint that identifies the cache's owner
+from app.crypto.crypto_utils import password_fingerprint
 # Import TLS-based sharing methods (assumed to exist)
-from app.p2p.p2p import share_password, receive_password
-
-# Define vault file location
-VAULT_PATH = Path("app/data/vault.json")
+from app.p2p.p2p import share_password, receive_password_async
+
+# Port digits without sign, spaces or separators; the range is checked after int()
+_PORT_RE = re.compile(r"^0*[1-9][0-9]{0,4}$")
+
+def _is_port_or_empty(value: str) -> bool:
+    # An empty port field falls back to the default port
+    value = value.strip()
+    return not value or (bool(_PORT_RE.match(value)) and int(value) <= 65535)
+
+_DEFAULT_PEER_IP = "127.0.0.1"
+_DEFAULT_PEER_PORT = "65432"
+
+_INPUT_FIELDS = ("master", "service", "username", "password", "peer_ip", "peer_port")
+
+_HELP_TEXT = (
+    "[Help]\n"
+    "- Enter a Master Password (min 8 chars) to encrypt/decrypt vault entries.\n"
+    "- Save entries with Service, Username, and Password.\n"
+    "- Load Vault to decrypt and view stored passwords.\n"
+    "- Share and Receive allow P2P encrypted password transfer; Stop ends a pending Receive.\n"
+    "- Click a vault row to copy the password.\n"
+    "- Copy Table copies all entries to clipboard.\n"
+    "- Clear Vault deletes all stored entries (requires clicking Confirm or Cancel to abort).\n"
+    "- Toggle Password Visibility shows/hides the password field.\n"
+    "- Use Reset to clear the form and cancel confirmations.\n"
+)
 
 class PasswordManagerApp(App):
     """Textual TUI application for managing encrypted passwords with P2P sharing."""
 
+    # Status messages for the password visibility toggle
+    _PW_HIDDEN_MSG = "Password field is now hidden"
+    _PW_VISIBLE_MSG = "Password field is now visible"
+
     CSS = """
     Screen {
         layout: vertical;
@@ -93,7 +130,31 @@ class PasswordManagerApp(App):
     def __init__(self, **kwargs) -> None:
         """Initialize the app with confirmation state."""
         super().__init__(**kwargs)
-        self._confirm_state: Optional[Tuple[str, str, Any]] = None  # Stores (action, confirm_id, data)
+        # Stores (action, confirm_id, data); save data is (entry, master, entries)
+        self._confirm_state: Optional[Tuple[str, str, Any]] = None
+        self._vault_entries: Optional[list] = None  # Decrypted entries cached from the last full decrypt
+        self._service_index: Dict[str, int] = {}  # Service name -> position in the cached entries
+        self._cache_owner: Optional[bytes] = None  # Fingerprint of the master the cache was built with
+        self._vault_mtime: Optional[int] = None  # Vault file mtime the cache corresponds to
+        self._table_synced = False  # Whether the table shows exactly the cached entries
+        self._displayed_rows: List[Tuple[str, str, str]] = []  # Rows currently shown in the table, in order
+        self._last_port: Optional[Tuple[str, int]] = None  # Last port string that validated, and its value
+        self._status_pending: Optional[str] = None  # Latest status message not yet drawn
+        self._status_shown: Optional[str] = None  # Status message currently in the widget
+        # Button id -> action; only the form-driven actions read the inputs
+        self._button_handlers: Dict[str, Callable[[], None]] = {
+            "save": lambda: self.handle_save_entry(self.get_input_values()),
+            "load": lambda: self.handle_load_vault(self._inputs["master"].value.strip()),
+            "share": self.start_share,
+            "receive": self.toggle_receive,
+            "reset": self.handle_reset_form,
+            "help": self.handle_show_help,
+            "copy_table": self.handle_copy_table,
+            "toggle_password": self.handle_toggle_password,
+            "clear_vault": self.handle_clear_vault,
+            "confirm": self.handle_confirm,
+            "cancel": self.handle_cancel,
+        }
 
     def compose(self) -> ComposeResult:
         yield Header()
@@ -124,7 +185,13 @@ class PasswordManagerApp(App):
 
                 Label("P2P Share/Receive"),
                 Input(placeholder="Peer IP (127.0.0.1)", id="peer_ip"),
-                Input(placeholder="Port (65432)", id="peer_port"),
+                # Flag a bad port while it is typed; validate_port still guards Share and Receive
+                Input(
+                    placeholder="Port (65432)",
+                    id="peer_port",
+                    validators=[Function(_is_port_or_empty, "Port must be between 1 and 65535.")],
+                    validate_on=["changed"],
+                ),
                 
                 Horizontal(
                     Button("Share", id="share", variant="primary"),
@@ -150,88 +217,145 @@ class PasswordManagerApp(App):
 
     def on_mount(self) -> None:
         """Initialize the vault table on app start."""
-        table = self.query_one("#vault_table", DataTable)
+        # Cache widget handles so event handlers don't walk the DOM on every press
+        self._inputs: Dict[str, Input] = {
+            field: self.query_one(f"#{field}", Input) for field in _INPUT_FIELDS
+        }
+        self._status = self.query_one("#status", Static)
+        self._table = self.query_one("#vault_table", DataTable)
+        self._confirm_button = self.query_one("#confirm", Button)
+        self._cancel_button = self.query_one("#cancel", Button)
+        self._receive_button = self.query_one("#receive", Button)
+
+        table = self._table
         table.cursor_type = "row"
         table.zebra_stripes = True
         table.add_columns("Service", "Username", "Password")  # Initialize table columns
+        # Create the data directory once here rather than on every write
+        VAULT_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+    def on_unmount(self) -> None:
+        """Release the vault's append handle on exit."""
+        close_vault()
 
     def get_input_values(self) -> Dict[str, str]:
         """Helper method to retrieve values from input fields."""
-        return {
-            "master": self.query_one("#master", Input).value.strip(),
-            "service": self.query_one("#service", Input).value.strip(),
-            "username": self.query_one("#username", Input).value.strip(),
-            "password": self.query_one("#password", Input).value.strip(),
-            "peer_ip": self.query_one("#peer_ip", Input).value.strip() or "127.0.0.1",
-            "peer_port": self.query_one("#peer_port", Input).value.strip() or "65432",
-        }
+        values = {field: widget.value.strip() for field, widget in self._inputs.items()}
+        values["peer_ip"] = values["peer_ip"] or _DEFAULT_PEER_IP
+        values["peer_port"] = values["peer_port"] or _DEFAULT_PEER_PORT
+        return values
+
+    def copy_text(self, text: str) -> str:
+        """Place text on the clipboard, returning how it was copied for the status bar."""
+        try:
+            pyperclip.copy(text)
+            return "copied to clipboard"
+        except pyperclip.PyperclipException:
+            driver = self._driver
+            if driver is None or driver.is_headless:
+                raise
+        # No system clipboard (e.g. over SSH): ask the terminal to set it through
+        # OSC 52. Terminals without OSC 52 support ignore it, so don't claim a copy.
+        driver.write(f"\x1b]52;c;{b64encode(text.encode()).decode()}\a")
+        return "sent to terminal clipboard"
 
     def update_status(self, message: str) -> None:
         """Helper method to update the status widget."""
-        self.query_one("#status", Static).update(message)
+        # Messages set while a handler runs collapse into one widget update once it yields
+        if self._status_pending is None:
+            self.call_later(self.flush_status)
+        self._status_pending = message
+
+    def flush_status(self) -> None:
+        """Show the latest pending status message."""
+        message, self._status_pending = self._status_pending, None
+        if message is not None and message != self._status_shown:
+            self._status.update(message)
+            self._status_shown = message
 
     def toggle_confirm_button(self, show: bool) -> None:
-        """Show or hide the Confirm and Cancel buttons with error handling."""
-        try:
-            confirm_button = self.query_one("#confirm", Button)
-            cancel_button = self.query_one("#cancel", Button)
-            confirm_button.classes = [] if show else ["hidden"]
-            cancel_button.classes = [] if show else ["hidden"]
-        except NoMatches:
-            self.update_status("[Error] Confirmation or Cancel button not found.")
-        except Exception as e:
-            self.update_status(f"[Error] Failed to toggle confirmation buttons: {str(e)}")
+        """Show or hide the Confirm and Cancel buttons."""
+        self._confirm_button.classes = [] if show else ["hidden"]
+        self._cancel_button.classes = [] if show else ["hidden"]
 
     def validate_port(self, port_str: str) -> Optional[int]:
         """Validate that the port is a number between 1 and 65535."""
-        try:
+        # Share and Receive usually run back to back with the same port field
+        if self._last_port is not None and self._last_port[0] == port_str:
+            return self._last_port[1]
+        if _PORT_RE.match(port_str):
             port = int(port_str)
-            if 1 <= port <= 65535:
+            if port <= 65535:
+                self._last_port = (port_str, port)
                 return port
-            self.update_status("[Error] Port must be between 1 and 65535.")
-            return None
-        except ValueError:
+        elif not port_str.isdigit():
             self.update_status("[Error] Port must be a valid number.")
             return None
+        self.update_status("[Error] Port must be between 1 and 65535.")
+        return None
+
+    def check_service_exists(self, service: str) -> bool:
+        """Check if a service name already exists in the vault index."""
+        return service in self._service_index
+
+    def vault_cache_matches(self, master: str) -> bool:
+        """Whether the cached entries came from the current vault file under this master password."""
+        return (
+            self._vault_entries is not None
+            and self._cache_owner == password_fingerprint(master)
+            and self._vault_mtime == vault_mtime()
+        )
 
-    def check_service_exists(self, service: str, data: list) -> bool:
-        """Check if a service name already exists in the vault."""
-        for record in data:
-            try:
-                entry = json.loads(decrypt(self.get_input_values()["master"], record))
-                if entry.get("service") == service:
-                    return True
-            except Exception:
-                continue
-        return False
+    def cache_vault_entries(self, master: str, entries: list, mtime: Optional[int] = None) -> None:
+        """Remember decrypted entries and their service index until the vault file changes.
+
+        Pass the mtime read before decrypting when the file may have changed since.
+        """
+        owner = password_fingerprint(master)
+        if owner != self._cache_owner:
+            self._table_synced = False
+        self._vault_entries = entries
+        self._service_index = {entry["service"]: index for index, entry in enumerate(entries)}
+        self._cache_owner = owner
+        self._vault_mtime = vault_mtime() if mtime is None else mtime
+
+    def populate_table(self, entries: list) -> None:
+        """Replace the table rows with the given entries."""
+        table = self._table
+        rows = [(entry["service"], entry["username"], entry["password"]) for entry in entries]
+        # Insert all rows in one call and repaint once at the end
+        with self.batch_update():
+            table.clear()  # Clear rows but keep columns
+            table.add_rows(rows)
+        self._displayed_rows = rows
+
+    def clear_table(self) -> None:
+        """Remove all rows from the table, keeping its columns."""
+        self._table.clear()
+        self._displayed_rows = []
+        # An empty table no longer mirrors the cache, so saves mustn't add rows to it
+        self._table_synced = False
 
     def on_button_pressed(self, event: Button.Pressed) -> None:
         """Handle button press events."""
-        button_id = event.button.id
-        inputs = self.get_input_values()
-
-        if button_id == "save":
-            self.handle_save_entry(inputs)
-        elif button_id == "load":
-            self.handle_load_vault(inputs["master"])
-        elif button_id == "share":
-            self.handle_share_entry(inputs)
-        elif button_id == "receive":
-            self.handle_receive_entry(inputs["peer_port"])
-        elif button_id == "reset":
-            self.handle_reset_form()
-        elif button_id == "help":
-            self.handle_show_help()
-        elif button_id == "copy_table":
-            self.handle_copy_table()
-        elif button_id == "toggle_password":
-            self.handle_toggle_password()
-        elif button_id == "clear_vault":
-            self.handle_clear_vault()
-        elif button_id == "confirm":
-            self.handle_confirm()
-        elif button_id == "cancel":
-            self.handle_cancel()
+        handler = self._button_handlers.get(event.button.id)
+        if handler:
+            handler()
+
+    def start_share(self) -> None:
+        """Start sharing the form's entry."""
+        # Connect and send on a worker so the UI keeps drawing during the TLS handshake
+        self.run_worker(self.handle_share_entry(self.get_input_values()), group="share")
+
+    def toggle_receive(self) -> None:
+        """Start listening for a shared entry, or stop a pending listener."""
+        # Pressing Receive while listening stops the listener and frees the port
+        if self.workers.cancel_group(self, "receive"):
+            self.update_status("Stopped waiting for a password.")
+            return
+        # Listen on the app's event loop so the UI stays responsive
+        port_str = self._inputs["peer_port"].value.strip() or _DEFAULT_PEER_PORT
+        self.run_worker(self.handle_receive_entry(port_str), group="receive")
 
     def handle_save_entry(self, inputs: Dict[str, str]) -> None:
         """Handle saving a new vault entry with confirmation."""
@@ -247,20 +371,36 @@ class PasswordManagerApp(App):
             "username": inputs["username"],
             "password": inputs["password"],
         }
-        data = []
-        VAULT_PATH.parent.mkdir(parents=True, exist_ok=True)
-        if VAULT_PATH.exists():
+        master = inputs["master"]
+        entries = None
+        if self.vault_cache_matches(master):
+            entries = self._vault_entries
+            exists = self.check_service_exists(entry["service"])
+        else:
+            # Records carrying service tags answer the duplicate check without any decryption
             try:
-                with open(VAULT_PATH, "r") as f:
-                    data = json.load(f)
-            except json.JSONDecodeError:
+                exists = service_in_vault(master, read_vault(), entry["service"])
+            except (json.JSONDecodeError, CorruptVaultError):
                 self.update_status("[Error] Vault file is corrupted.")
                 return
+            except Exception:
+                self.update_status("[Error] Incorrect master password.")
+                return
+            if exists is None:
+                loaded = self.read_vault_entries(master)
+                if loaded is None:
+                    return
+                entries, errors = loaded
+                if errors:
+                    self.confirm_partial_save(entry, master, entries, errors)
+                    return
+                exists = self.check_service_exists(entry["service"])
 
         # Check for duplicate service name
-        if self.check_service_exists(inputs["service"], data):
+        if exists:
             confirm_id = str(uuid4())
-            self._confirm_state = ("save", confirm_id, entry)
+            # Keep the master with the entry so Confirm needn't read the form again
+            self._confirm_state = ("save", confirm_id, (entry, master, None))
             self.update_status(
                 f"Service '{inputs['service']}' already exists. Click Confirm to overwrite or Cancel to abort."
             )
@@ -268,16 +408,64 @@ class PasswordManagerApp(App):
             return
 
         # Save the entry
-        encrypted = encrypt(inputs["master"], json.dumps(entry))
-        data.append(encrypted)
-        with open(VAULT_PATH, "w") as f:
-            json.dump(data, f)
+        try:
+            append_entry(master, entries or [], entry)
+        except CorruptVaultError:
+            self.update_status("[Error] Vault file is corrupted.")
+            return
+        except ValueError as e:
+            self.update_status(f"[Error] {e}")
+            return
+        if entries is None:
+            # Saved by tag alone: nothing was decrypted, so the table may not show this vault
+            self._table_synced = False
+        else:
+            # The cache holds this vault; extend it rather than rebuild it
+            entries.append(entry)
+            self._service_index[entry["service"]] = len(entries) - 1
+            self._vault_mtime = vault_mtime()
+        if self._table_synced:
+            # Show the new row without reloading the vault
+            row = (entry["service"], entry["username"], entry["password"])
+            self._table.add_row(*row)
+            self._displayed_rows.append(row)
         self.update_status("Entry saved successfully.")
-        self.query_one("#master", Input).value = ""  # Clear master password
+        self._inputs["master"].value = ""  # Clear master password
+
+    def confirm_partial_save(self, entry: Dict[str, str], master: str, entries: list, errors: int) -> None:
+        """Ask before a save rewrites a vault holding records this master can't decrypt."""
+        confirm_id = str(uuid4())
+        # Confirm writes the readable entries plus this one; the unreadable records are lost
+        self._confirm_state = ("save", confirm_id, (entry, master, entries))
+        self.update_status(
+            f"{errors} vault entries can't be decrypted with this master password and will be dropped "
+            "when the vault is rewritten. Click Confirm to save anyway or Cancel to abort."
+        )
+        self.toggle_confirm_button(True)
+
+    def read_vault_entries(self, master: str) -> Optional[Tuple[list, int]]:
+        """Return the decrypted vault for a save and its count of unreadable records.
+
+        Returns None after reporting a corrupted vault or a wrong master password.
+        """
+        if self.vault_cache_matches(master):
+            return self._vault_entries, 0
+        try:
+            # A missing vault yields nothing and decrypts to no entries
+            entries, errors = decrypt_vault(master, iter_vault())
+        except (json.JSONDecodeError, CorruptVaultError):
+            self.update_status("[Error] Vault file is corrupted.")
+            return None
+        except Exception:
+            self.update_status("[Error] Incorrect master password.")
+            return None
+        if not errors:
+            self.cache_vault_entries(master, entries)
+        return entries, errors
 
     def handle_clear_vault(self) -> None:
         """Handle initiating the vault clear action with confirmation."""
-        if not VAULT_PATH.exists():
+        if not vault_exists():
             self.update_status("[Error] No vault found to clear.")
             return
 
@@ -300,30 +488,50 @@ class PasswordManagerApp(App):
         self.toggle_confirm_button(False)
 
         if action == "save" and data:
+            entry, master, entries = data
             try:
-                vault_data = []
-                if VAULT_PATH.exists():
-                    with open(VAULT_PATH, "r") as f:
-                        vault_data = json.load(f)
-                encrypted = encrypt(self.get_input_values()["master"], json.dumps(data))
-                vault_data.append(encrypted)
-                with open(VAULT_PATH, "w") as f:
-                    json.dump(vault_data, f)
-                self.update_status("Entry overwritten successfully.")
-                self.query_one("#master", Input).value = ""
-            except json.JSONDecodeError:
-                self.update_status("[Error] Vault file is corrupted.")
+                if entries is None:
+                    loaded = self.read_vault_entries(master)
+                    if loaded is None:
+                        return
+                    entries, errors = loaded
+                    if errors:
+                        self.confirm_partial_save(entry, master, entries, errors)
+                        return
+                else:
+                    # Already confirmed dropping the unreadable records; the rewrite leaves just these
+                    self.cache_vault_entries(master, entries)
+                # Replace the existing entry for this service in place; the index says where it is
+                position = self._service_index.get(entry["service"])
+                if position is None:
+                    # A new service, or one removed from the vault since the duplicate check
+                    self._service_index[entry["service"]] = len(entries)
+                    entries.append(entry)
+                else:
+                    entries[position] = entry
+                write_vault(master, entries)
+                self._vault_mtime = vault_mtime()
+                if self._table_synced:
+                    self.populate_table(entries)
+                if position is None:
+                    self.update_status("Entry saved successfully.")
+                else:
+                    self.update_status("Entry overwritten successfully.")
+                self._inputs["master"].value = ""
             except Exception as e:
+                self._vault_entries = None  # The cache may hold an entry that never reached disk
                 self.update_status(f"[Error] Failed to save entry: {str(e)}")
 
         elif action == "clear":
             try:
-                # Clear the vault file by writing an empty list
-                with open(VAULT_PATH, "w") as f:
-                    json.dump([], f)
-                # Clear the table
-                table = self.query_one("#vault_table", DataTable)
-                table.clear()
+                # Clear the vault file by writing an empty vault
+                clear_vault()
+                self._vault_entries = []
+                self._service_index.clear()
+                self._vault_mtime = vault_mtime()
+                # Clear the table, which now shows the empty cache exactly
+                self.clear_table()
+                self._table_synced = True
                 self.update_status("Vault cleared successfully.")
             except Exception as e:
                 self.update_status(f"[Error] Failed to clear vault: {str(e)}")
@@ -342,35 +550,56 @@ class PasswordManagerApp(App):
         if len(master) < 8:
             self.update_status("[Error] Master password must be at least 8 characters.")
             return
-        if not VAULT_PATH.exists():
+        if not vault_exists():
             self.update_status("[Error] No vault found.")
             return
 
-        table = self.query_one("#vault_table", DataTable)
-        table.clear()  # Clear rows but keep columns
-        try:
-            with open(VAULT_PATH, "r") as f:
-                data = json.load(f)
-        except json.JSONDecodeError:
-            self.update_status("[Error] Vault file is corrupted.")
+        if self.vault_cache_matches(master):
+            # Vault unchanged since it was last decrypted under this master
+            self.show_loaded_vault(self._vault_entries, 0)
             return
+        self.clear_table()
+        self.update_status("Loading vault... (please wait)")
+        # The KDF and record decryption run on a thread so the UI keeps drawing
+        self.run_worker(
+            partial(self.decrypt_vault_in_thread, master), thread=True, group="load", exclusive=True
+        )
 
-        errors = 0
-        for record in data:
-            try:
-                entry = json.loads(decrypt(master, record))
-                table.add_row(entry["service"], entry["username"], entry["password"])
-            except Exception:
-                errors += 1
-        if errors == len(data):
+    def decrypt_vault_in_thread(self, master: str) -> None:
+        """Decrypt the vault off the event loop and hand the result back to the UI."""
+        mtime = vault_mtime()  # Taken first, so a write during the decrypt marks the cache stale
+        try:
+            # Stream records from the file so they don't all sit in memory at once
+            entries, errors = decrypt_vault(master, iter_vault())
+        except (json.JSONDecodeError, CorruptVaultError):
+            self.call_from_thread(self.update_status, "[Error] Vault file is corrupted.")
+            return
+        except Exception:
+            # Damaged records are counted, not raised; this is the key unwrap failing
+            self.call_from_thread(self.update_status, "[Error] Incorrect master password.")
+            return
+        if not get_current_worker().is_cancelled:  # A newer Load supersedes this one
+            self.call_from_thread(self.finish_vault_load, master, entries, errors, mtime)
+
+    def finish_vault_load(self, master: str, entries: list, errors: int, mtime: Optional[int]) -> None:
+        """Cache a freshly decrypted vault when every record decrypted, then display it."""
+        if not errors:
+            self.cache_vault_entries(master, entries, mtime)
+        self.show_loaded_vault(entries, errors)
+
+    def show_loaded_vault(self, entries: list, errors: int) -> None:
+        """Display decrypted entries and report how the load went."""
+        self.populate_table(entries)
+        self._table_synced = not errors
+        if errors and not entries:
             self.update_status("[Error] Decryption failed for all entries.")
         elif errors > 0:
             self.update_status(f"Loaded vault with {errors} decryption errors.")
         else:
             self.update_status("Vault loaded successfully.")
-        self.query_one("#master", Input).value = ""
+        self._inputs["master"].value = ""
 
-    def handle_share_entry(self, inputs: Dict[str, str]) -> None:
+    async def handle_share_entry(self, inputs: Dict[str, str]) -> None:
         """Handle sharing an entry via P2P."""
         port = self.validate_port(inputs["peer_port"])
         if not port:
@@ -380,13 +609,13 @@ class PasswordManagerApp(App):
             return
 
         self.update_status("Sharing password... (please wait)")
-        payload = json.dumps({
+        payload = dumps({
             "service": inputs["service"],
             "username": inputs["username"],
             "password": inputs["password"],
-        })
+        }).decode()
         try:
-            share_password(payload, host=inputs["peer_ip"], port=port)
+            await asyncio.to_thread(share_password, payload, host=inputs["peer_ip"], port=port)
             self.update_status(f"Password shared to {inputs['peer_ip']}:{port}.")
         except ConnectionRefusedError:
             self.update_status(f"[Error] Connection refused by {inputs['peer_ip']}:{port}.")
@@ -395,21 +624,22 @@ class PasswordManagerApp(App):
         except Exception as e:
             self.update_status(f"[Error] Share failed: {str(e)}")
 
-    def handle_receive_entry(self, port_str: str) -> None:
+    async def handle_receive_entry(self, port_str: str) -> None:
         """Handle receiving an entry via P2P."""
         port = self.validate_port(port_str)
         if not port:
             return
 
-        self.update_status("Waiting to receive password... (please wait)")
+        self.update_status("Waiting to receive password... (press Stop to cancel)")
+        self._receive_button.label = "Stop"
         try:
-            received = receive_password(port=port)
+            received = await receive_password_async(port=port)
             if received:
                 try:
-                    entry = json.loads(received)
-                    self.query_one("#service", Input).value = entry.get("service", "")
-                    self.query_one("#username", Input).value = entry.get("username", "")
-                    self.query_one("#password", Input).value = entry.get("password", "")
+                    entry = loads(received)
+                    self._inputs["service"].value = entry.get("service", "")
+                    self._inputs["username"].value = entry.get("username", "")
+                    self._inputs["password"].value = entry.get("password", "")
                     self.update_status("Password received successfully.")
                 except json.JSONDecodeError:
                     self.update_status("[Error] Invalid data received.")
@@ -419,65 +649,47 @@ class PasswordManagerApp(App):
             self.update_status(f"[Error] Receive failed: {str(e)}")
         except Exception as e:
             self.update_status(f"[Error] Receive failed: {str(e)}")
+        finally:
+            self._receive_button.label = "Receive"
 
     def handle_reset_form(self) -> None:
         """Handle resetting all input fields."""
-        for field in ["master", "service", "username", "password", "peer_ip", "peer_port"]:
-            self.query_one(f"#{field}", Input).value = ""
+        for widget in self._inputs.values():
+            widget.value = ""
         self.update_status("Form reset.")
         self.toggle_confirm_button(False)  # Hide Confirm button if visible
         self._confirm_state = None  # Clear confirmation state
 
     def handle_show_help(self) -> None:
         """Handle displaying help instructions."""
-        help_text = (
-            "[Help]\n"
-            "- Enter a Master Password (min 8 chars) to encrypt/decrypt vault entries.\n"
-            "- Save entries with Service, Username, and Password.\n"
-            "- Load Vault to decrypt and view stored passwords.\n"
-            "- Share and Receive allow P2P encrypted password transfer.\n"
-            "- Click a vault row to copy the password.\n"
-            "- Copy Table copies all entries to clipboard.\n"
-            "- Clear Vault deletes all stored entries (requires clicking Confirm or Cancel to abort).\n"
-            "- Toggle Password Visibility shows/hides the password field.\n"
-            "- Use Reset to clear the form and cancel confirmations.\n"
-        )
-        self.update_status(help_text)
+        self.update_status(_HELP_TEXT)
 
     def handle_copy_table(self) -> None:
         """Handle copying the entire table to the clipboard."""
-        table = self.query_one("#vault_table", DataTable)
-        if not table.row_count:
+        if not self._displayed_rows:
             self.update_status("[Error] Table is empty.")
             return
 
-        table_data = []
-        for row_key in table.rows.keys():
-            # Use get_row to retrieve the cell values as a list
-            row_cells = table.get_row(row_key)
-            table_data.append("\t".join(str(cell) for cell in row_cells))
-        table_text = "\n".join(table_data)
+        # Build the text from the rows we put in the table, not back through the widget
+        table_text = "\n".join("\t".join(row) for row in self._displayed_rows)
         try:
-            pyperclip.copy(table_text)
-            self.update_status("Table copied to clipboard.")
+            copied = self.copy_text(table_text)
+            self.update_status(f"Table {copied}.")
         except Exception as e:
             self.update_status(f"[Error] Clipboard copy failed: {str(e)}")
 
     def handle_toggle_password(self) -> None:
         """Handle toggling password field visibility."""
-        password_input = self.query_one("#password", Input)
+        password_input = self._inputs["password"]
         password_input.password = not password_input.password
-        self.update_status(
-            "Password field is now " + ("hidden" if password_input.password else "visible")
-        )
+        self.update_status(self._PW_HIDDEN_MSG if password_input.password else self._PW_VISIBLE_MSG)
 
     def on_data_table_row_selected(self, message: DataTable.RowSelected) -> None:
         """Copy password to clipboard when a table row is selected."""
-        table = self.query_one("#vault_table", DataTable)
         if message.row_key is not None:
-            row = table.get_row(message.row_key)
+            row = self._table.get_row(message.row_key)
             try:
-                pyperclip.copy(row[-1])
-                self.update_status(f"Password for {row[0]} copied to clipboard.")
+                copied = self.copy_text(row[-1])
+                self.update_status(f"Password for {row[0]} {copied}.")
             except Exception as e:
                 self.update_status(f"[Error] Clipboard copy failed: {str(e)}")
\ No newline at end of file
@@ -1,5 +1,12 @@
 from app.ui.main_ui import PasswordManagerApp
 
+try:
+    import uvloop  # Optional faster event loop for the P2P listener
+except ImportError:
+    uvloop = None
+
 if __name__ == "__main__":
+    if uvloop:
+        uvloop.install()
     app = PasswordManagerApp()
     app.run()
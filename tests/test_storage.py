@@ -0,0 +1,208 @@
+import json
+import os
+import tempfile
+import unittest
+from base64 import urlsafe_b64encode
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+from app.crypto.crypto_utils import encrypt_raw, service_tag, unwrap_key
+from app.storage import storage
+from app.storage.storage import (
+    FRAME,
+    LEGACY_VAULT_PATH,
+    MAGIC,
+    VAULT_PATH,
+    CorruptVaultError,
+    append_entry,
+    clear_vault,
+    close_vault,
+    decrypt_vault,
+    iter_vault,
+    read_vault,
+    service_in_vault,
+    write_vault,
+)
+
+MASTER = "correct horse"
+
+def entry(service: str) -> dict:
+    return {"service": service, "username": f"{service}-user", "password": f"{service}-pw"}
+
+def legacy_record(password: str, plaintext: str) -> dict:
+    """Encrypt a record the way the original vault.json was written."""
+    salt = os.urandom(16)
+    nonce = os.urandom(12)
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=100_000)
+    ciphertext = AESGCM(kdf.derive(password.encode())).encrypt(nonce, plaintext.encode(), None)
+    return {
+        "salt": urlsafe_b64encode(salt).decode(),
+        "nonce": urlsafe_b64encode(nonce).decode(),
+        "ciphertext": urlsafe_b64encode(ciphertext).decode(),
+    }
+
+class VaultTestCase(unittest.TestCase):
+    """Runs each test in an empty working directory, since the vault paths are relative."""
+
+    def setUp(self) -> None:
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        VAULT_PATH.parent.mkdir(parents=True)
+
+    def tearDown(self) -> None:
+        close_vault()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def services(self) -> list:
+        entries, errors = decrypt_vault(MASTER, iter_vault())
+        self.assertEqual(errors, 0)
+        return [e["service"] for e in entries]
+
+class FrameTests(VaultTestCase):
+    def test_header_then_raw_records(self) -> None:
+        write_vault(MASTER, [entry("a"), entry("b")])
+        items = read_vault()
+        self.assertIsInstance(items[0], dict)
+        self.assertIn("wrapped_key", items[0])
+        self.assertEqual(len(items), 3)
+        self.assertTrue(all(isinstance(record, bytes) for record in items[1:]))
+        self.assertTrue(VAULT_PATH.read_bytes().startswith(MAGIC))
+
+    def test_frame_spans(self) -> None:
+        buf = MAGIC + FRAME.pack(3) + b"abc" + FRAME.pack(0) + FRAME.pack(2) + b"de"
+        spans = list(storage._frame_spans(buf))
+        payloads = [buf[start + FRAME.size:end] for start, end in spans]
+        self.assertEqual(payloads, [b"abc", b"", b"de"])
+
+    def test_round_trip_and_append(self) -> None:
+        write_vault(MASTER, [entry("a")])
+        append_entry(MASTER, [], entry("b"))
+        self.assertEqual(self.services(), ["a", "b"])
+
+    def test_missing_and_cleared_vaults_are_empty(self) -> None:
+        self.assertEqual(read_vault(), [])
+        write_vault(MASTER, [entry("a")])
+        clear_vault()
+        self.assertEqual(read_vault(), [])
+        self.assertEqual(decrypt_vault(MASTER, iter_vault()), ([], 0))
+
+    def test_foreign_file_is_corrupt(self) -> None:
+        VAULT_PATH.write_bytes(b"not a vault")
+        with self.assertRaises(CorruptVaultError):
+            read_vault()
+
+    def test_wrong_master_raises(self) -> None:
+        write_vault(MASTER, [entry("a")])
+        with self.assertRaises(InvalidTag):
+            decrypt_vault("wrong master", iter_vault())
+
+    def test_damaged_record_is_counted(self) -> None:
+        write_vault(MASTER, [entry("a"), entry("b"), entry("c")])
+        data = bytearray(VAULT_PATH.read_bytes())
+        data[-1] ^= 1  # Last byte of the last record's AEAD tag
+        VAULT_PATH.write_bytes(bytes(data))
+        entries, errors = decrypt_vault(MASTER, iter_vault())
+        self.assertEqual([e["service"] for e in entries], ["a", "b"])
+        self.assertEqual(errors, 1)
+
+    def test_record_that_is_not_an_entry_is_counted(self) -> None:
+        write_vault(MASTER, [entry("a")])
+        key = unwrap_key(MASTER, read_vault()[0])
+        alg, nonce, ciphertext = encrypt_raw(key, b"[1, 2]")
+        record = bytes((storage._ALG_IDS[alg],)) + nonce + service_tag(key, "b") + ciphertext
+        with open(VAULT_PATH, "ab") as f:
+            f.write(FRAME.pack(len(record)) + record)
+        entries, errors = decrypt_vault(MASTER, iter_vault())
+        self.assertEqual([e["service"] for e in entries], ["a"])
+        self.assertEqual(errors, 1)
+
+    def test_service_tags(self) -> None:
+        write_vault(MASTER, [entry("a"), entry("b")])
+        self.assertTrue(service_in_vault(MASTER, read_vault(), "b"))
+        self.assertFalse(service_in_vault(MASTER, read_vault(), "c"))
+
+class TruncationTests(VaultTestCase):
+    def tear_last_frame(self, keep: int) -> None:
+        data = VAULT_PATH.read_bytes()
+        VAULT_PATH.write_bytes(data[:len(data) - keep])
+
+    def assert_loads_with_errors(self, services: list, errors: int) -> None:
+        entries, count = decrypt_vault(MASTER, iter_vault())
+        self.assertEqual([e["service"] for e in entries], services)
+        self.assertEqual(count, errors)
+
+    def test_torn_record_is_counted(self) -> None:
+        write_vault(MASTER, [entry("a"), entry("b")])
+        self.tear_last_frame(5)
+        self.assert_loads_with_errors(["a"], 1)
+
+    def test_torn_length_prefix_is_counted(self) -> None:
+        write_vault(MASTER, [entry("a")])
+        with open(VAULT_PATH, "ab") as f:
+            f.write(FRAME.pack(100)[:2])
+        self.assert_loads_with_errors(["a"], 1)
+
+    def test_corrupt_length_prefix_mid_file(self) -> None:
+        write_vault(MASTER, [entry(name) for name in "abcd"])
+        data = bytearray(VAULT_PATH.read_bytes())
+        second = list(storage._frame_spans(data))[2][0]
+        data[second + FRAME.size - 1] ^= 0x40  # High byte: declares about 1 GiB
+        VAULT_PATH.write_bytes(bytes(data))
+        with self.assertRaises(CorruptVaultError):
+            decrypt_vault(MASTER, iter_vault())
+        with self.assertRaises(CorruptVaultError):
+            append_entry(MASTER, [], entry("e"))
+        self.assertEqual(VAULT_PATH.read_bytes(), bytes(data))
+
+    def test_oversized_entry_is_refused(self) -> None:
+        write_vault(MASTER, [entry("a")])
+        with self.assertRaises(ValueError):
+            append_entry(MASTER, [], {**entry("b"), "password": "x" * storage.MAX_RECORD_SIZE})
+        self.assertEqual(self.services(), ["a"])
+
+    def test_append_trims_torn_record(self) -> None:
+        write_vault(MASTER, [entry("a"), entry("b")])
+        self.tear_last_frame(5)
+        append_entry(MASTER, [], entry("c"))
+        self.assertEqual(self.services(), ["a", "c"])
+
+class LegacyMigrationTests(VaultTestCase):
+    def write_legacy(self, records: list, **dump_args) -> None:
+        with open(LEGACY_VAULT_PATH, "w") as f:
+            json.dump(records, f, **dump_args)
+
+    def test_reads_pretty_printed_vault_json(self) -> None:
+        records = [legacy_record(MASTER, json.dumps(entry(name))) for name in ("a", "b")]
+        self.write_legacy(records, indent=2)
+        self.assertEqual(self.services(), ["a", "b"])
+        self.assertIsNone(service_in_vault(MASTER, read_vault(), "a"))
+
+    def test_save_migrates_to_vault_bin(self) -> None:
+        self.write_legacy([legacy_record(MASTER, json.dumps(entry("a")))])
+        entries, _ = decrypt_vault(MASTER, iter_vault())
+        append_entry(MASTER, entries, entry("b"))
+        self.assertFalse(LEGACY_VAULT_PATH.exists())
+        self.assertTrue(VAULT_PATH.read_bytes().startswith(MAGIC))
+        self.assertEqual(self.services(), ["a", "b"])
+
+    def test_records_under_another_master_are_counted(self) -> None:
+        self.write_legacy([
+            legacy_record(MASTER, json.dumps(entry("a"))),
+            legacy_record("other master", json.dumps(entry("b"))),
+        ])
+        entries, errors = decrypt_vault(MASTER, iter_vault())
+        self.assertEqual([e["service"] for e in entries], ["a"])
+        self.assertEqual(errors, 1)
+
+    def test_non_list_vault_json_is_corrupt(self) -> None:
+        self.write_legacy({"not": "a list"})
+        with self.assertRaises(CorruptVaultError):
+            read_vault()
+
+if __name__ == "__main__":
+    unittest.main()